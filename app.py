@@ -1,31 +1,67 @@
 """
 app.py - TribalGIS OCR+NER + WebGIS demo with UI/UX and persistence (SQLite).
-Run: python app.py
+Run: python app.py            (development, Werkzeug reloader)
+     gunicorn -w 1 -k gthread --threads 8 --preload wsgi:app   (production, see wsgi.py)
 Open: http://127.0.0.1:5000
 """
 
+import asyncio
+import csv
+import io
+import json
 import os
+import queue
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import sqlite3
+import tempfile
+import threading
 import time
-from flask import Flask, request, jsonify, render_template_string, render_template, g, redirect, url_for, session
+import uuid
+from flask import Flask, Response, request, jsonify, render_template, g, redirect, url_for, session, stream_with_context
 from PIL import Image
 import pytesseract
 import spacy
 from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
+from geopy.adapters import AioHTTPAdapter
+from geopy.extra.rate_limiter import AsyncRateLimiter
 from flask_cors import CORS
-from functools import wraps
+from flask_compress import Compress
+from functools import wraps, lru_cache
+import orjson
+try:
+    # tesserocr binds libtesseract directly; fall back to the pytesseract CLI wrapper if it isn't installed
+    from tesserocr import PyTessBaseAPI, PSM, OEM
+except ImportError:
+    PyTessBaseAPI = None
+try:
+    # optional GPU OCR; only used when CUDA is available
+    import easyocr
+    import numpy as np
+    import torch
+except ImportError:
+    easyocr = None
 
 # ----------------- CONFIG -----------------
 DB_PATH = "claims.db"
+# optional GeoNames extract for India with columns name,lat,lon,population
+GAZETTEER_PATH = "geonames_IN.csv"
+GAZETTEER_MIN_POPULATION = 10000
+# shorter gazetteer names (Pen, Mau, Ron...) collide with ordinary words, so they are left to the NER
+RULER_MIN_NAME_LEN = 4
 UPLOAD_FOLDER = "uploads"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 # optionally set tesseract path on Windows:
 pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+# LSTM engine only (faster init than legacy+LSTM), automatic page segmentation
+TESS_CONFIG = "--oem 1 --psm 3"
 
 # ----------------- APP -----------------
 app = Flask(__name__, template_folder='templates')
 CORS(app)
+# gzip HTML and JSON responses (streamed /markers included)
+app.config["COMPRESS_MIMETYPES"] = ["text/html", "application/json", "text/css", "application/javascript"]
+Compress(app)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["JSON_SORT_KEYS"] = False
 app.secret_key = 'your-secret-key-here'  # Change this to a secure secret key
@@ -46,26 +82,101 @@ def login_required(f):
     return decorated_function
 
 # ----------------- DB -----------------
+# journal_mode=WAL is persisted in the database file, so it only needs to be
+# switched once per process; the remaining PRAGMAs are per-connection.
+_wal_enabled = False
+
+def connect_db():
+    global _wal_enabled
+    db = sqlite3.connect(DB_PATH, check_same_thread=False)
+    db.row_factory = sqlite3.Row
+    if not _wal_enabled:
+        mode = db.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        _wal_enabled = mode.lower() == "wal"
+    db.execute("PRAGMA synchronous=NORMAL")   # WAL makes NORMAL crash-safe, far fewer fsyncs
+    db.execute("PRAGMA temp_store=MEMORY")
+    db.execute("PRAGMA mmap_size=268435456")  # 256 MB
+    db.execute("PRAGMA cache_size=-20000")    # ~20 MB page cache
+    db.execute("PRAGMA busy_timeout=5000")    # wait for the writer instead of failing with "database is locked"
+    return db
+
+# One process-wide connection serves the one-shot read paths: no connect()/PRAGMA cost per
+# request, and in WAL mode its readers never block (or are blocked by) the writers below.
+# Only use it for queries that are read to completion right away: an unfinished cursor keeps
+# the connection inside one read transaction, pinning every other reader to that old snapshot.
+# Streaming reads borrow a connection from STREAM_POOL; writes use a short-lived per-request one from get_db().
+READ_CONN = None
+READ_CONN_LOCK = threading.Lock()
+
+def get_read_db():
+    global READ_CONN
+    if READ_CONN is None:
+        with READ_CONN_LOCK:
+            if READ_CONN is None:
+                db = connect_db()
+                db.execute("PRAGMA query_only=ON")
+                READ_CONN = db
+    return READ_CONN
+
+# Query-only connections for streamed reads, each held by one response until it is fully sent.
+# Kept and reused so /markers skips connect() + PRAGMAs; if more streams run at once, extra
+# connections are opened and closed again when the pool is full.
+STREAM_POOL_SIZE = 4
+STREAM_POOL = queue.LifoQueue(maxsize=STREAM_POOL_SIZE)
+
+def borrow_stream_db():
+    try:
+        return STREAM_POOL.get_nowait()
+    except queue.Empty:
+        db = connect_db()
+        db.execute("PRAGMA query_only=ON")
+        return db
+
+def release_stream_db(db):
+    try:
+        STREAM_POOL.put_nowait(db)
+    except queue.Full:
+        db.close()
+
+def close_stream_pool():
+    while True:
+        try:
+            STREAM_POOL.get_nowait().close()
+        except queue.Empty:
+            return
+
 def get_db():
+    global _wal_enabled, READ_CONN
     db = getattr(g, "_database", None)
     if db is None:
         try:
-            db = g._database = sqlite3.connect(DB_PATH)
-            db.row_factory = sqlite3.Row
+            db = g._database = connect_db()
         except sqlite3.Error as e:
             print(f"Database connection error: {e}")
             # If database is corrupted, delete it and try again
             if "disk image is malformed" in str(e):
                 try:
                     os.remove(DB_PATH)
-                    db = g._database = sqlite3.connect(DB_PATH)
-                    db.row_factory = sqlite3.Row
+                    _wal_enabled = False  # fresh file starts in rollback-journal mode
+                    if READ_CONN is not None:
+                        READ_CONN.close()  # still points at the removed file
+                        READ_CONN = None
+                    close_stream_pool()
+                    db = g._database = connect_db()
                     init_db()  # Reinitialize tables
                 except Exception as ex:
                     print(f"Failed to recreate database: {ex}")
                     raise
     return db
 
+def query_dicts(db, sql, params=()):
+    # plain tuples + one zip per row: cheaper than building dicts from sqlite3.Row
+    cur = db.cursor()
+    cur.row_factory = None
+    cur.execute(sql, params)
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, row)) for row in cur]
+
 def init_db():
     db = get_db()
     try:
@@ -88,6 +199,16 @@ def init_db():
             seq INTEGER,
             FOREIGN KEY (claim_id) REFERENCES claims(id)
         )""")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_points_claim_seq ON points(claim_id, seq)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_points_lat_lon ON points(lat, lon)")
+        # place name -> coordinates; NULL lat/lon records a name Nominatim could not resolve
+        db.execute("""
+        CREATE TABLE IF NOT EXISTS geocode_cache (
+            name TEXT PRIMARY KEY,
+            lat REAL,
+            lon REAL,
+            ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""")
         db.commit()
         print("Database initialized successfully")
     except Exception as e:
@@ -100,13 +221,241 @@ def close_connection(exception):
     if db is not None:
         db.close()
 
+# ----------------- OCR -----------------
+# Ask torch to probe CUDA through NVML: a plain is_available() initializes CUDA in this process,
+# and the forked OCR workers could then no longer use the GPU.
+os.environ.setdefault("PYTORCH_NVML_BASED_CUDA_CHECK", "1")
+GPU_OCR = easyocr is not None and torch.cuda.is_available()
+# images are resized to a fixed size so readtext_batched can stack them into GPU batches
+OCR_BATCH_SIZE = 8
+OCR_WIDTH, OCR_HEIGHT = 800, 600
+READER = None
+
+# One long-lived Tesseract instance per OCR worker process: the model is loaded once instead
+# of per upload. The API object is not thread-safe, so calls are serialized with TESS_LOCK.
+TESS_API = None
+TESS_LOCK = threading.Lock()
+
+def init_ocr():
+    global TESS_API, TESS_LOCK, READER
+    TESS_LOCK = threading.Lock()  # a forked worker may have inherited the parent's lock in a held state
+    if GPU_OCR:
+        READER = easyocr.Reader(["en"], gpu=True, cudnn_benchmark=True)
+        # warm up once at worker start so cuDNN autotunes for the batch shape before real pages arrive
+        READER.readtext_batched(np.zeros((OCR_BATCH_SIZE, OCR_HEIGHT, OCR_WIDTH, 3), np.uint8),
+                                batch_size=OCR_BATCH_SIZE)
+    elif PyTessBaseAPI is not None:
+        TESS_API = PyTessBaseAPI(lang="eng", psm=PSM.AUTO, oem=OEM.LSTM_ONLY)
+
+def ocr_image(path):
+    if READER is not None:
+        return "\n".join(READER.readtext(path, detail=0, paragraph=True))
+    if TESS_API is None:
+        # pass the path straight through: no PIL decode + temp PNG re-encode before tesseract reads it
+        return pytesseract.image_to_string(path, config=TESS_CONFIG)
+    with TESS_LOCK:
+        TESS_API.SetImageFile(path)
+        return TESS_API.GetUTF8Text()
+
+# EasyOCR and tesserocr can OCR an upload straight from memory; the tesseract CLI only reads
+# files, so without them the upload is saved once and its path is handed to the worker.
+# Decided in the parent from what init_ocr() will pick in the workers.
+IN_MEMORY_OCR = GPU_OCR or PyTessBaseAPI is not None
+
+def ocr_bytes(data):
+    if READER is not None:
+        return "\n".join(READER.readtext(data, detail=0, paragraph=True))
+    with TESS_LOCK:
+        TESS_API.SetImage(Image.open(io.BytesIO(data)))
+        return TESS_API.GetUTF8Text()
+
+def ocr_images(paths):
+    if READER is not None:
+        pages = READER.readtext_batched(paths, n_width=OCR_WIDTH, n_height=OCR_HEIGHT,
+                                        batch_size=OCR_BATCH_SIZE, detail=0, paragraph=True)
+        return ["\n".join(lines) for lines in pages]
+    if TESS_API is not None:
+        # the persistent API already skips per-image init
+        return [ocr_image(p) for p in paths]
+    # without tesserocr, hand tesseract a list file so its model is loaded once for all images
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", dir=UPLOAD_FOLDER, delete=False) as lst:
+        lst.write("\n".join(os.path.abspath(p) for p in paths) + "\n")
+    try:
+        out = pytesseract.image_to_string(lst.name, config=TESS_CONFIG)
+    finally:
+        os.remove(lst.name)
+    # tesseract ends every page with a form feed
+    pages = out.split("\x0c")[:-1]
+    if len(pages) != len(paths):
+        raise RuntimeError(f"expected {len(paths)} pages from tesseract, got {len(pages)} (multi-page files are not supported in batch mode)")
+    return pages
+
 # ----------------- NLP + GEO -----------------
-# Load spaCy model (NER)
-nlp = spacy.load("en_core_web_sm")
+# Load spaCy model (NER) - only doc.ents is used, so skip the tagger/parser/lemmatizer stages
+nlp = spacy.load("en_core_web_sm", disable=["tagger", "parser", "attribute_ruler", "lemmatizer"])
+
+# only attempt geocode for GPE/LOC/PLACE-like labels and if text length reasonable
+GEO_LABELS = frozenset({"GPE", "LOC", "FAC", "NORP", "ORG"})
+MAX_NAME_LEN = 120
+
+# In-memory gazetteer of Indian places; a hit skips both the cache table and Nominatim.
+# Where names repeat, the most populous place wins.
+def load_gazetteer(path):
+    # returns {lowercased name: (lat, lon)} plus the original-case spellings for the EntityRuler
+    gazetteer, population, names = {}, {}, set()
+    if not os.path.exists(path):
+        print(f"Gazetteer {path} not found, geocoding via cache + Nominatim only")
+        return gazetteer, names
+    with open(path, newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh):
+            try:
+                pop = int(row["population"] or 0)
+                coords = (float(row["lat"]), float(row["lon"]))
+            except (KeyError, TypeError, ValueError):
+                continue  # short rows leave missing columns as None
+            name = (row["name"] or "").strip()
+            if not name or pop <= GAZETTEER_MIN_POPULATION:
+                continue
+            names.add(name)
+            key = name.lower()
+            if pop > population.get(key, -1):
+                gazetteer[key], population[key] = coords, pop
+    print(f"Loaded {len(gazetteer)} gazetteer places")
+    return gazetteer, names
+
+GAZETTEER, GAZETTEER_NAMES = load_gazetteer(GAZETTEER_PATH)
+
+# Tag gazetteer names with a phrase-matching EntityRuler ahead of the statistical NER, so known
+# places in noisy OCR text are found reliably; NER still picks up ORG/FAC and unlisted places.
+# Ruler spans override the NER, so match the exact spelling (ORTH): lowercase "pen" is not Pen.
+ruler_names = [n for n in GAZETTEER_NAMES if len(n) >= RULER_MIN_NAME_LEN]
+if ruler_names:
+    ruler = nlp.add_pipe("entity_ruler", before="ner", config={"phrase_matcher_attr": "ORTH"})
+    ruler.add_patterns([{"label": "GPE", "pattern": name} for name in ruler_names])
+
+# two-tier cache in front of Nominatim: in-process LRU, then the geocode_cache table
+@lru_cache(maxsize=4096)
+def cached_coords(name):
+    row = get_read_db().execute("SELECT lat, lon FROM geocode_cache WHERE name=?", (name,)).fetchone()
+    if row is None:
+        # lru_cache does not memoize exceptions, so a miss is looked up again once it has been stored
+        raise KeyError(name)
+    return (row["lat"], row["lon"]) if row["lat"] is not None else None
+
+def store_coords(results):
+    db = get_db()
+    db.executemany("INSERT OR REPLACE INTO geocode_cache (name, lat, lon) VALUES (?,?,?)",
+                   [(name, *(coords or (None, None))) for name, coords in results.items()])
+    db.commit()
+
+# Nominatim allows 1 req/s per client; every event loop gets its own AsyncRateLimiter,
+# so concurrent /extract requests take turns on the network phase.
+NOMINATIM_LOCK = threading.Lock()
+
+async def geocode_all(names):
+    # requests are still spaced 1s apart, but their network latency overlaps
+    async with Nominatim(user_agent="tribalgis_demo_app", adapter_factory=AioHTTPAdapter) as geolocator:
+        # swallow_exceptions=False so failures surface as geo_error instead of being cached as "not found"
+        geocode = AsyncRateLimiter(geolocator.geocode, min_delay_seconds=1, max_retries=2,
+                                   error_wait_seconds=2.0, swallow_exceptions=False)
+        return await asyncio.gather(*[geocode(n) for n in names], return_exceptions=True)
+
+def entities_from_doc(doc):
+    # seq tracks order of appearance
+    return [{"label": ent.label_, "text": ent.text, "seq": seq}
+            for seq, ent in enumerate(doc.ents, start=1)]
+
+def is_geo_candidate(e):
+    return e["label"] in GEO_LABELS and len(e["text"]) < MAX_NAME_LEN
+
+def geocode_entities(entities):
+    # geocode each distinct place name once (case-insensitive) and fan the result back to every mention
+    candidates = [e for e in entities if is_geo_candidate(e)]
+    unique = dict.fromkeys(e["text"].strip().lower() for e in candidates)
+    coord_map = {}
+    misses = []
+    for key in unique:
+        if key in GAZETTEER:
+            coord_map[key] = GAZETTEER[key]
+            continue
+        try:
+            coord_map[key] = cached_coords(key)
+        except KeyError:
+            misses.append(key)
+    if misses:
+        with NOMINATIM_LOCK:
+            places = asyncio.run(geocode_all(misses))
+        found = {}
+        for key, place in zip(misses, places):
+            if isinstance(place, Exception):
+                # ignore geocode failure (rate limited or not found)
+                coord_map[key] = place
+            else:
+                coord_map[key] = found[key] = (place.latitude, place.longitude) if place else None
+        if found:
+            store_coords(found)
+    for e in candidates:
+        result = coord_map[e["text"].strip().lower()]
+        if isinstance(result, Exception):
+            e["geo_error"] = str(result)
+        elif result:
+            e["coordinates"] = {"lat": result[0], "lon": result[1]}
+    return entities
+
+# ----------------- WORKERS -----------------
+# OCR + NER are CPU-bound and the NER part holds the GIL, so they run in worker processes;
+# geocoding stays on the request thread since it is network-bound and uses the DB.
+# Workers start on the first upload, so the Werkzeug reloader's watcher process never loads Tesseract.
+def _init_worker():
+    # spaCy is already loaded by the module import (or inherited on fork); only the OCR engine is per-process
+    init_ocr()
+
+def ocr_and_ner(source):
+    # source is the upload's bytes when IN_MEMORY_OCR, otherwise the path it was saved to
+    try:
+        text = ocr_bytes(source) if isinstance(source, bytes) else ocr_image(source)
+    except Exception as e:
+        raise RuntimeError(f"OCR failed: {e}") from None  # plain message pickles back to the parent
+    return text, entities_from_doc(nlp(text))
 
-# Geopy Nominatim with rate limiter (avoid hammering the server)
-geolocator = Nominatim(user_agent="tribalgis_demo_app")
-geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1, max_retries=2, error_wait_seconds=2.0)
+def ocr_and_ner_batch(paths):
+    try:
+        texts = ocr_images(paths)
+    except Exception as e:
+        raise RuntimeError(f"OCR failed: {e}") from None
+    return texts, [entities_from_doc(doc) for doc in nlp.pipe(texts, batch_size=32)]
+
+def new_executor():
+    # with GPU OCR a single worker holds the model on the device and batches on it
+    return ProcessPoolExecutor(max_workers=1 if GPU_OCR else os.cpu_count(), initializer=_init_worker)
+
+# Built lazily in the process that serves requests: a pool created before a fork (e.g. in the
+# Gunicorn master under --preload) would share its call/result queues with every forked worker
+# and deadlock. EXECUTOR_PID catches a pool inherited across a fork anyway.
+EXECUTOR = None
+EXECUTOR_PID = None
+EXECUTOR_LOCK = threading.Lock()
+
+def get_executor():
+    global EXECUTOR, EXECUTOR_PID
+    with EXECUTOR_LOCK:
+        if EXECUTOR is None or EXECUTOR_PID != os.getpid():
+            EXECUTOR, EXECUTOR_PID = new_executor(), os.getpid()
+        return EXECUTOR
+
+def run_in_pool(fn, arg):
+    # A worker that dies (OOM kill, native crash in tesseract/torch) breaks the whole pool;
+    # fail only this request and swap in a fresh pool for the next ones.
+    global EXECUTOR
+    executor = get_executor()
+    try:
+        return executor.submit(fn, arg).result()
+    except BrokenProcessPool:
+        with EXECUTOR_LOCK:
+            if EXECUTOR is executor:  # a concurrent request may already have replaced it
+                EXECUTOR = None       # next get_executor() builds a fresh pool
+        executor.shutdown(wait=False)
+        raise RuntimeError("OCR worker crashed while processing this upload, please retry") from None
 
 # ----------------- HTML (embedded template) -----------------
 HTML = """
@@ -299,8 +648,17 @@ HTML = """
 </body>
 </html>
 """
+# compiled once at import; render_template_string would re-parse the source on every hit
+HTML_TMPL = app.jinja_env.from_string(HTML)
 
 # ----------------- API: extract OCR + NER + geocode -----------------
+def write_upload(path, data):
+    try:
+        with open(path, "wb") as out:
+            out.write(data)
+    except OSError as e:
+        print(f"Failed to store upload {path}: {e}")
+
 @app.route("/extract", methods=["POST"])
 def extract():
     try:
@@ -309,37 +667,50 @@ def extract():
         f = request.files["file"]
         filename = f.filename or f"upload_{int(time.time())}.png"
         saved_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-        f.save(saved_path)
-
-        # OCR
-        try:
-            text = pytesseract.image_to_string(Image.open(saved_path))
-        except Exception as e:
-            return jsonify({"error": f"OCR failed: {e}"}), 500
-
-        # NER via spaCy
-        doc = nlp(text)
-        entities = []
-        # track order
-        seq = 0
-        for ent in doc.ents:
-            seq += 1
-            entd = {"label": ent.label_, "text": ent.text, "seq": seq}
-            # only attempt geocode for GPE/LOC/PLACE-like labels and if text length reasonable
-            if ent.label_ in ("GPE", "LOC", "FAC", "NORP", "ORG") and len(ent.text) < 120:
-                try:
-                    place = geocode(ent.text)
-                    if place:
-                        entd["coordinates"] = {"lat": place.latitude, "lon": place.longitude}
-                except Exception as ge:
-                    # ignore geocode failure (rate limited or not found)
-                    entd["geo_error"] = str(ge)
-            entities.append(entd)
+        if IN_MEMORY_OCR:
+            # Werkzeug already spools the upload (in memory when small); OCR works on the bytes
+            # while the copy kept in UPLOAD_FOLDER is written in the background
+            source = f.read()
+            threading.Thread(target=write_upload, args=(saved_path, source)).start()
+        else:
+            f.save(saved_path)
+            source = saved_path
+
+        # OCR + NER in a worker process, then geocode place-like entities
+        text, entities = run_in_pool(ocr_and_ner, source)
+        entities = geocode_entities(entities)
 
         return jsonify({"text": text, "entities": entities})
     except Exception as ex:
         return jsonify({"error": str(ex)}), 500
 
+# ----------------- API: batch extract -----------------
+@app.route("/extract_batch", methods=["POST"])
+def extract_batch():
+    try:
+        files = request.files.getlist("files")
+        if not files:
+            return jsonify({"error": "No files uploaded"}), 400
+        filenames, paths = [], []
+        for i, f in enumerate(files):
+            filename = f.filename or f"upload_{int(time.time())}_{i}.png"
+            # unique stored name: a batch may carry several files with the same client name
+            # (e.g. two scan.png), which would otherwise overwrite each other on disk
+            saved_path = os.path.join(app.config["UPLOAD_FOLDER"], f"{uuid.uuid4().hex}_{filename}")
+            f.save(saved_path)
+            filenames.append(filename)
+            paths.append(saved_path)
+
+        # one OCR + NER pass over all files in a worker, then geocode every place name once across the batch
+        texts, entities_per_file = run_in_pool(ocr_and_ner_batch, paths)
+        geocode_entities([e for ents in entities_per_file for e in ents])
+
+        results = [{"filename": fn, "text": t, "entities": ents}
+                   for fn, t, ents in zip(filenames, texts, entities_per_file)]
+        return jsonify({"results": results})
+    except Exception as ex:
+        return jsonify({"error": str(ex)}), 500
+
 # ----------------- API: save result into DB -----------------
 @app.route("/save", methods=["POST"])
 def save():
@@ -351,22 +722,22 @@ def save():
         entities = payload.get("entities",[])
         filename = payload.get("filename","uploaded")
 
+        # build everything before taking the write lock so it is held only for the inserts
+        entities_json = json.dumps(entities, ensure_ascii=False)
+        located = [e for e in entities if "coordinates" in e]
+        point_rows = [(e.get("label",""), e.get("text",""), e["coordinates"]["lat"], e["coordinates"]["lon"], seq)
+                      for seq, e in enumerate(located, start=1)]
+
         db = get_db()
-        cur = db.cursor()
-        cur.execute("INSERT INTO claims (filename, text, entities) VALUES (?,?,?)", (filename, text, str(entities)))
-        claim_id = cur.lastrowid
-
-        seq = 0
-        for e in entities:
-            if "coordinates" in e:
-                seq += 1
-                lat = e["coordinates"]["lat"]
-                lon = e["coordinates"]["lon"]
-                label = e.get("label","")
-                name = e.get("text","")
-                cur.execute("INSERT INTO points (claim_id, label, name, lat, lon, seq) VALUES (?,?,?,?,?,?)",
-                            (claim_id, label, name, lat, lon, seq))
-        db.commit()
+        # take the write lock up front so a concurrent writer makes us wait (busy_timeout)
+        # instead of failing when a deferred transaction tries to upgrade its lock;
+        # `with db` commits on success and rolls back on error
+        db.execute("BEGIN IMMEDIATE")
+        with db:
+            claim_id = db.execute("INSERT INTO claims (filename, text, entities) VALUES (?,?,?) RETURNING id",
+                                  (filename, text, entities_json)).fetchone()[0]
+            db.executemany("INSERT INTO points (claim_id, label, name, lat, lon, seq) VALUES (?,?,?,?,?,?)",
+                           [(claim_id, *r) for r in point_rows])
         return jsonify({"success": True, "claim_id": claim_id})
     except Exception as ex:
         return jsonify({"error": str(ex)}), 500
@@ -375,13 +746,46 @@ def save():
 @app.route("/markers", methods=["GET"])
 def markers():
     try:
-        db = get_db()
-        cur = db.cursor()
-        rows = cur.execute("SELECT p.id, p.claim_id, p.label, p.name, p.lat, p.lon, p.seq FROM points p ORDER BY p.id DESC").fetchall();
-        out = []
-        for r in rows:
-            out.append({"id": r["id"], "claim_id": r["claim_id"], "label": r["label"], "name": r["name"], "lat": r["lat"], "lon": r["lon"], "seq": r["seq"]})
-        return jsonify(out)
+        # optional ?bbox=lat1,lon1,lat2,lon2 - filtered in SQL so points outside never leave SQLite
+        where, params = "", ()
+        bbox = request.args.get("bbox")
+        if bbox:
+            try:
+                lat1, lon1, lat2, lon2 = (float(v) for v in bbox.split(","))
+            except ValueError:
+                return jsonify({"error": "bbox must be lat1,lon1,lat2,lon2"}), 400
+            where = " WHERE lat BETWEEN ? AND ? AND lon BETWEEN ? AND ?"
+            params = (min(lat1, lat2), max(lat1, lat2), min(lon1, lon2), max(lon1, lon2))
+
+        # pooled connection for the stream: a half-read cursor on READ_CONN would hold its
+        # snapshot open for every other reader until the client has received all rows
+        db = borrow_stream_db()
+        try:
+            # run the query up front so SQL errors still become a JSON 500, then stream rows as they are read
+            cur = db.cursor()
+            cur.row_factory = None
+            cur.execute("SELECT id, claim_id, label, name, lat, lon, seq FROM points" + where + " ORDER BY id DESC", params)
+            keys = [d[0] for d in cur.description]
+        except Exception:
+            release_stream_db(db)
+            raise
+
+        def gen():
+            try:
+                yield b"["
+                sep = b""
+                # emit a few hundred rows per chunk rather than one socket write per marker
+                while rows := cur.fetchmany(500):
+                    yield sep + b",".join(orjson.dumps(dict(zip(keys, r))) for r in rows)
+                    sep = b","
+                yield b"]"
+            finally:
+                # also runs when the client disconnects and the server closes the generator;
+                # closing the cursor ends its read transaction before the connection is reused
+                cur.close()
+                release_stream_db(db)
+
+        return Response(stream_with_context(gen()), mimetype="application/json")
     except Exception as ex:
         return jsonify({"error": str(ex)}), 500
     
@@ -415,7 +819,7 @@ def index():
 @app.route("/app")
 @login_required
 def main_app():
-    return render_template_string(HTML)
+    return render_template(HTML_TMPL)
 
 # ----------------- UI: Database Viewer -----------------
 DB_VIEW_HTML = """
@@ -438,7 +842,7 @@ DB_VIEW_HTML = """
       const data = await res.json();
       let html = '<h5>Claims</h5><table class="table table-bordered"><thead><tr><th>ID</th><th>Filename</th><th>Text</th><th>Entities</th><th>Saved At</th></tr></thead><tbody>';
       data.claims.forEach(c => {
-        html += `<tr><td>${c.id}</td><td>${c.filename}</td><td><pre>${c.text}</pre></td><td><pre>${c.entities}</pre></td><td>${c.saved_at}</td></tr>`;
+        html += `<tr><td>${c.id}</td><td>${c.filename}</td><td><pre>${c.text}</pre></td><td><pre>${typeof c.entities === 'string' ? c.entities : JSON.stringify(c.entities, null, 1)}</pre></td><td>${c.saved_at}</td></tr>`;
       });
       html += '</tbody></table>';
       html += '<h5>Points</h5><table class="table table-bordered"><thead><tr><th>ID</th><th>Claim ID</th><th>Label</th><th>Name</th><th>Lat</th><th>Lon</th><th>Seq</th></tr></thead><tbody>';
@@ -453,20 +857,24 @@ DB_VIEW_HTML = """
 </body>
 </html>
 """
+DB_VIEW_TMPL = app.jinja_env.from_string(DB_VIEW_HTML)
 
 @app.route("/db")
 def db_view():
-    return render_template_string(DB_VIEW_HTML)
+    return render_template(DB_VIEW_TMPL)
 
 @app.route("/db_data")
 def db_data():
     try:
-        db = get_db()
-        claims = db.execute("SELECT * FROM claims ORDER BY id DESC").fetchall()
-        points = db.execute("SELECT * FROM points ORDER BY id DESC").fetchall()
-        claims_out = [dict(row) for row in claims]
-        points_out = [dict(row) for row in points]
-        return jsonify({"claims": claims_out, "points": points_out})
+        db = get_read_db()
+        claims_out = query_dicts(db, "SELECT * FROM claims ORDER BY id DESC")
+        for c in claims_out:
+            try:
+                c["entities"] = orjson.loads(c["entities"])
+            except (TypeError, ValueError):
+                pass  # rows saved before entities were stored as JSON hold a Python repr string
+        points_out = query_dicts(db, "SELECT * FROM points ORDER BY id DESC")
+        return Response(orjson.dumps({"claims": claims_out, "points": points_out}), mimetype="application/json")
     except Exception as ex:
         return jsonify({"error": str(ex)}), 500
 
@@ -0,0 +1,12 @@
+"""
+wsgi.py - production entry point for TribalGIS (Gunicorn instead of the Werkzeug dev server).
+Run: gunicorn -w 1 -k gthread --threads 8 --preload wsgi:app
+"""
+
+from app import app, init_db
+
+# with --preload this runs once in the Gunicorn master, together with the spaCy model load
+# in app.py, and the forked workers share those pages copy-on-write. The OCR process pool is
+# deliberately not built here: each worker creates its own on first use (app.get_executor).
+with app.app_context():
+    init_db()